@@ -1,32 +1,112 @@
 """
 Render.com Ready OCR API
-Flask web service for PDF/Image OCR processing
+Quart (ASGI) web service for PDF/Image OCR processing
 - Supports: file upload, file_url, pdf_path
 """
 
-from flask import Flask, request, jsonify
-from werkzeug.utils import secure_filename
 import os
+
+# Tesseract's OpenMP runtime otherwise spawns one thread per core on every
+# call; pages are already OCR'd in parallel, so keep each engine single-threaded.
+# Must be set before tesserocr (libtesseract) is loaded.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+from quart import Quart, Response, request
+import orjson
 from pathlib import Path
-from PIL import Image
-import pytesseract
-from pdf2image import convert_from_path
+import asyncio
+import functools
+import hashlib
+import importlib
+import io
+import math
+import queue
+import threading
 import tempfile
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from urllib.parse import urlparse
 
-app = Flask(__name__)
+# PIL, numpy, cv2, fitz (PyMuPDF), tesserocr, diskcache and httpx are imported
+# on first use via _lazy_import(), so workers boot fast and /health answers
+# before any OCR stack is loaded.
+
+app = Quart(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
 
 # Allowed file extensions
-ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+ALLOWED_EXTENSIONS = frozenset({'pdf', 'png', 'jpg', 'jpeg'})
+ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in sorted(ALLOWED_EXTENSIONS))
+
+# Read size when streaming a file_url download
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Upper bound on pages OCR'd concurrently (and on idle engines kept per language)
+MAX_OCR_WORKERS = os.cpu_count() or 4
+
+# Tesseract modes: LSTM engine only, and by default treat a page as one
+# uniform block of text, which skips the slow automatic layout analysis
+DEFAULT_OEM = 1  # tesserocr.OEM.LSTM_ONLY
+DEFAULT_PSM = 6  # tesserocr.PSM.SINGLE_BLOCK
+# Modes that recognize text; 0 (OSD only) and 2 (layout only) return none
+VALID_PSMS = frozenset({1, *range(3, 14)})  # PSM.AUTO_OSD, PSM.AUTO .. PSM.RAW_LINE
+
+# Process-wide cap on pages being OCR'd at once, across all requests
+OCR_SEM = threading.BoundedSemaphore(MAX_OCR_WORKERS)
+
+# Per-client rate limit on /ocr/* endpoints (token bucket, per worker process)
+RATE_LIMIT_PER_MINUTE = 30
+RATE_LIMIT_BURST = 10
+
+# Reverse proxies in front of the app that append to X-Forwarded-For (1 on
+# Render). With the default 0 the header is ignored, since a client talking to
+# the server directly could otherwise pick its own rate-limit key.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+
+# Rendered pages waiting for an OCR worker (bounds peak bitmap memory)
+RENDER_QUEUE_SIZE = 2
+
+# Render DPI when none is given. With dpi='auto', page 1 is probed at
+# PROBE_DPI and scaled so glyphs come out at roughly TARGET_GLYPH_PX tall
+# (OCR cost grows with DPI squared)
+DEFAULT_DPI = 200
+PROBE_DPI = 100
+TARGET_GLYPH_PX = 30
+MIN_AUTO_DPI = 150
+MAX_DPI = 300
+
+# Non-whitespace characters a page's embedded text layer needs to be used
+# as-is instead of OCR
+MIN_TEXT_LAYER_CHARS = 200
+
+# Content-addressed OCR result cache, on disk so worker processes share it
+RESULT_CACHE_DIR = os.environ.get('OCR_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ocr-cache'))
+RESULT_CACHE_SIZE = 500 * 1024 * 1024  # bytes
+RESULT_CACHE_TTL = 24 * 60 * 60  # seconds
 
 # Base dir for server-side pdf_path (CHANGED: now points to repo root)
 SAFE_BASE_DIR = Path(__file__).parent.resolve()  # This is the repo root where app.py lives
+_SAFE_BASE_RESOLVED = str(SAFE_BASE_DIR)
+
+
+def ojson(obj, status=200, headers=None):
+    """JSON response serialized with orjson (much faster than stdlib json on large OCR text)"""
+    return Response(orjson.dumps(obj), status=status, headers=headers, mimetype='application/json')
+
+
+@functools.lru_cache(maxsize=None)
+def _lazy_import(name):
+    """Import a heavy module on first use; cached so it happens once per worker"""
+    module = importlib.import_module(name)
+    if name == 'cv2':
+        # Pages are already preprocessed in parallel; keep OpenCV's own pool out of it
+        module.setNumThreads(1)
+    return module
 
 
 def allowed_file(filename: str) -> bool:
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(ALLOWED_SUFFIXES)
 
 
 def is_http_url(s: str) -> bool:
@@ -37,16 +117,65 @@ def is_http_url(s: str) -> bool:
         return False
 
 
-def is_safe_path(base_dir: Path, user_path: Path) -> bool:
+def parse_flag(value) -> bool:
+    """Boolean request parameter: JSON true, or a form value such as 1/true/yes"""
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def is_safe_path(user_path: Path) -> bool:
     """
-    Ensure user_path stays within base_dir to avoid path traversal.
+    Ensure user_path stays within SAFE_BASE_DIR to avoid path traversal.
+    Only user_path is resolved; the base is resolved once at import.
     """
     try:
-        # Python 3.9+: Path.is_relative_to
-        return user_path.resolve().is_relative_to(base_dir.resolve())
-    except AttributeError:
-        # For Python < 3.9
-        return str(user_path.resolve()).startswith(str(base_dir.resolve()))
+        return os.path.commonpath([os.path.realpath(user_path), _SAFE_BASE_RESOLVED]) == _SAFE_BASE_RESOLVED
+    except ValueError:
+        # Paths on different drives have no common path
+        return False
+
+
+class TokenBucket:
+    """Token bucket per client key: `rate` tokens/second, up to `burst` saved"""
+
+    # Forget fully refilled clients once this many are tracked
+    MAX_CLIENTS = 10000
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    def consume(self, key):
+        """
+        Take one token for key.
+
+        Returns:
+            float: 0 if allowed, otherwise seconds until a token is available
+        """
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            retry_after = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            retry_after = (1 - tokens) / self.rate
+
+        if len(self._buckets) > self.MAX_CLIENTS:
+            self._prune(now)
+        return retry_after
+
+    def _prune(self, now):
+        refill_time = self.burst / self.rate
+        self._buckets = {
+            key: (tokens, last) for key, (tokens, last) in self._buckets.items()
+            if now - last < refill_time
+        }
+
+
+rate_limiter = TokenBucket(rate=RATE_LIMIT_PER_MINUTE / 60, burst=RATE_LIMIT_BURST)
 
 
 class SimpleOCR:
@@ -54,42 +183,276 @@ class SimpleOCR:
 
     def __init__(self, language='eng'):
         self.language = language
+        # Pool of tesseract engines (each keeps its tessdata loaded). A single
+        # engine is not thread-safe, so every concurrent page gets its own.
+        self._apis = queue.LifoQueue()
+        self._apis.put(self._new_api())
+
+    def close(self):
+        """Release all idle tesseract engines"""
+        apis = getattr(self, '_apis', None)
+        while apis is not None:
+            try:
+                apis.get_nowait().End()
+            except queue.Empty:
+                break
+
+    def __del__(self):
+        self.close()
+
+    def _new_api(self):
+        tesserocr = _lazy_import('tesserocr')
+        return tesserocr.PyTessBaseAPI(lang=self.language, oem=DEFAULT_OEM, psm=DEFAULT_PSM)
 
-    def pdf_to_text(self, pdf_path, max_pages=10, dpi=200):
+    @contextmanager
+    def _api(self):
+        """Check out a tesseract engine, creating one if all are busy"""
+        try:
+            api = self._apis.get_nowait()
+        except queue.Empty:
+            api = self._new_api()
+        try:
+            yield api
+        finally:
+            if self._apis.qsize() < MAX_OCR_WORKERS:
+                self._apis.put(api)
+            else:
+                api.End()
+
+    def preprocess_image(self, image):
         """
-        Convert PDF to text using OCR.
+        Denoise and binarize a page before OCR: an edge-preserving bilateral
+        filter followed by an Otsu threshold, so Tesseract gets clean
+        black-on-white input. Opt-in (preprocess=True): it costs about a
+        quarter of a second per 300 DPI page and does not help clean renders,
+        so it is only worth it for noisy scans and photos.
 
         Args:
-            pdf_path (str): Path to PDF file
-            max_pages (int): Maximum pages to process
-            dpi (int): Image quality for OCR
+            image (PIL.Image | np.ndarray): Page or image; arrays must be 8-bit grayscale
 
         Returns:
-            dict: Processing results
+            np.ndarray: Contiguous 8-bit binary image
+        """
+        Image, np, cv2 = _lazy_import('PIL.Image'), _lazy_import('numpy'), _lazy_import('cv2')
+        if isinstance(image, Image.Image):
+            image = np.asarray(image.convert('L') if image.mode != 'L' else image)
+        gray = cv2.bilateralFilter(image, 9, 75, 75)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return binary
+
+    def _ocr_image(self, image, psm=DEFAULT_PSM, dpi=None, preprocess=False):
+        """Run tesseract on a grayscale PIL image or array, optionally preprocessed first"""
+        # OCR_SEM caps in-flight page work (preprocessing included) across
+        # all requests in this process
+        with OCR_SEM:
+            if preprocess:
+                pixels = self.preprocess_image(image)
+            else:
+                pixels = _lazy_import('numpy').asarray(image)
+            height, width = pixels.shape
+            with self._api() as api:
+                api.SetPageSegMode(psm)
+                # Raw 1 byte/pixel buffer; SetImage would re-encode a PIL image
+                api.SetImageBytes(pixels.tobytes(), width, height, 1, width)
+                # Raw buffers carry no resolution; without it Tesseract assumes 70
+                if dpi:
+                    api.SetSourceResolution(dpi)
+                return api.GetUTF8Text()
+
+    def _render_gray(self, doc, page_index, dpi):
+        """In-process MuPDF render of one page straight to an 8-bit grayscale array"""
+        fitz, np = _lazy_import('fitz'), _lazy_import('numpy')
+        pix = doc.load_page(page_index).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+    def _render_pages(self, doc, page_nos, dpi, workers, pages, done, stop):
+        """Producer: render pages one at a time into the bounded queue"""
+        try:
+            for page_no in page_nos:
+                if stop.is_set():
+                    break
+                pages.put((page_no, self._render_gray(doc, page_no - 1, dpi)))
+        except Exception as e:
+            stop.set()
+            done.put((None, None, e))
+        finally:
+            # One sentinel per OCR worker
+            for _ in range(workers):
+                pages.put(None)
+
+    def _ocr_pages(self, pages, done, stop, psm, dpi, preprocess):
+        """Consumer: OCR queued pages until the producer's sentinel"""
+        while True:
+            item = pages.get()
+            if item is None:
+                break
+            page_no, image = item
+            try:
+                # Keep draining after a failure so the producer never blocks
+                if not stop.is_set():
+                    done.put((page_no, self._ocr_image(image, psm, dpi, preprocess), None))
+            except Exception as e:
+                stop.set()
+                done.put((page_no, None, e))
+            finally:
+                # Drop the bitmap now rather than when the next page arrives
+                del image, item
+
+    def _probe_dpi(self, doc, page_index=0):
+        """
+        Pick a render DPI from the median glyph height on a low-res render
+        of one page. Falls back to DEFAULT_DPI when nothing is found.
+        """
+        np, cv2 = _lazy_import('numpy'), _lazy_import('cv2')
+        gray = self._render_gray(doc, page_index, PROBE_DPI)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+        # Skip the background label and anything that is not glyph-sized
+        # (specks, rules, images)
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        heights = heights[(heights >= 2) & (heights <= gray.shape[0] // 10)]
+        if heights.size == 0:
+            return DEFAULT_DPI
+
+        glyph_height = float(np.median(heights))
+        dpi = int(TARGET_GLYPH_PX * PROBE_DPI / glyph_height)
+        return max(MIN_AUTO_DPI, min(MAX_DPI, dpi))
+
+    def _text_layer(self, doc, num_pages):
+        """
+        Return the embedded text of each of the first num_pages pages, with
+        None for pages whose layer is too sparse to trust (i.e. scanned pages).
         """
+        layer_text = []
+        for i in range(num_pages):
+            text = doc.load_page(i).get_text('text')
+            char_count = len(''.join(text.split()))
+            layer_text.append(text if char_count >= MIN_TEXT_LAYER_CHARS else None)
+        return layer_text
+
+    def _iter_ocr(self, doc, page_nos, dpi, psm, preprocess=False):
+        """Render and OCR the given (1-based) pages, yielding text in that order"""
+        # Render and OCR overlap: one producer renders page by page into a
+        # bounded queue while workers OCR, so only a few bitmaps are alive.
+        pages = queue.Queue(maxsize=RENDER_QUEUE_SIZE)
+        done = queue.Queue()
+        stop = threading.Event()
+        workers = max(1, min(len(page_nos), MAX_OCR_WORKERS))
+        # Only the producer thread touches doc while the pool is running
+        executor = ThreadPoolExecutor(max_workers=workers + 1)
         try:
-            images = convert_from_path(
-                pdf_path,
-                dpi=dpi,
-                first_page=1,
-                last_page=max_pages
-            )
+            executor.submit(self._render_pages, doc, page_nos, dpi, workers, pages, done, stop)
+            for _ in range(workers):
+                executor.submit(self._ocr_pages, pages, done, stop, psm, dpi, preprocess)
+
+            # Pages finish out of order; hold them until their turn
+            finished = {}
+            for page_no in page_nos:
+                while page_no not in finished:
+                    done_no, text, error = done.get()
+                    if error is not None:
+                        raise error
+                    finished[done_no] = text
+                yield {'page': page_no, 'text': finished.pop(page_no)}
+        finally:
+            # Also reached when the caller stops early: skip remaining pages
+            stop.set()
+            executor.shutdown(wait=True)
+
+    def iter_pages(self, pdf_source, max_pages=10, dpi=DEFAULT_DPI, psm=DEFAULT_PSM, preprocess=False):
+        """
+        Extract PDF text page by page, using the embedded text layer of pages
+        that have one and OCR for the rest. Each page is yielded as soon as it
+        and all pages before it are done; closing the generator stops the work.
+
+        Args:
+            pdf_source (str | bytes): Path to PDF file, or the PDF itself
+            max_pages (int): Maximum pages to process
+            dpi (int | str): Image quality for OCR ('auto': pick from text size)
+            psm (int): Tesseract page segmentation mode
+            preprocess (bool): Denoise and binarize pages before OCR
+
+        Yields:
+            dict: First a summary (num_pages, was_truncated, method, dpi),
+                then {'page': n, 'text': ...} for each page in order. method
+                is 'text_layer', 'ocr', or 'mixed' when only some pages were
+                OCR'd.
+        """
+        fitz = _lazy_import('fitz')
+        if isinstance(pdf_source, (bytes, bytearray)):
+            doc = fitz.open(stream=pdf_source, filetype='pdf')
+        else:
+            doc = fitz.open(pdf_source)
+
+        with doc:
+            total_pages = doc.page_count
+            num_pages = min(total_pages, max_pages)
+            was_truncated = total_pages > max_pages
+
+            # Digital pages already carry their text: no render, no OCR
+            layer_text = self._text_layer(doc, num_pages)
+            ocr_page_nos = [page_no for page_no, text in enumerate(layer_text, 1) if text is None]
+            if not ocr_page_nos:
+                method = 'text_layer'
+                dpi = None
+            else:
+                method = 'ocr' if len(ocr_page_nos) == num_pages else 'mixed'
+                if dpi == 'auto':
+                    dpi = self._probe_dpi(doc, ocr_page_nos[0] - 1)
+
+            yield {
+                'num_pages': num_pages,
+                'was_truncated': was_truncated,
+                'method': method,
+                'dpi': dpi
+            }
+
+            if not ocr_page_nos:
+                for page_no, text in enumerate(layer_text, 1):
+                    yield {'page': page_no, 'text': text}
+                return
 
-            num_pages = len(images)
-            was_truncated = num_pages >= max_pages
+            # Sparse pages come from the OCR pipeline, the rest from the layer
+            ocr_results = self._iter_ocr(doc, ocr_page_nos, dpi, psm, preprocess)
+            try:
+                for page_no, text in enumerate(layer_text, 1):
+                    if text is None:
+                        yield next(ocr_results)
+                    else:
+                        yield {'page': page_no, 'text': text}
+            finally:
+                ocr_results.close()
+
+    def pdf_to_text(self, pdf_source, max_pages=10, dpi=DEFAULT_DPI, psm=DEFAULT_PSM, preprocess=False):
+        """
+        Convert PDF to text, using the embedded text layer of pages that have
+        one and OCR for the rest.
 
-            all_text = []
-            for i, image in enumerate(images, 1):
-                text = pytesseract.image_to_string(image, lang=self.language)
-                all_text.append(text)
+        Args:
+            pdf_source (str | bytes): Path to PDF file, or the PDF itself
+            max_pages (int): Maximum pages to process
+            dpi (int | str): Image quality for OCR ('auto': pick from text size)
+            psm (int): Tesseract page segmentation mode
+            preprocess (bool): Denoise and binarize pages before OCR
+
+        Returns:
+            dict: Processing results
+        """
+        try:
+            pages = self.iter_pages(pdf_source, max_pages=max_pages, dpi=dpi, psm=psm, preprocess=preprocess)
+            summary = next(pages)
+            all_text = [page['text'] for page in pages]
 
             combined_text = "\n\n--- Page Break ---\n\n".join(all_text)
 
             return {
                 'success': True,
                 'text': combined_text,
-                'num_pages': num_pages,
-                'was_truncated': was_truncated,
+                'num_pages': summary['num_pages'],
+                'was_truncated': summary['was_truncated'],
+                'method': summary['method'],
+                'dpi': summary['dpi'],
                 'error': None
             }
 
@@ -99,14 +462,49 @@ class SimpleOCR:
                 'error': str(e),
                 'text': None,
                 'num_pages': 0,
-                'was_truncated': False
+                'was_truncated': False,
+                'method': None,
+                'dpi': None
             }
 
-    def image_to_text(self, image_path):
-        """Extract text from a single image"""
+    def _to_gray(self, image):
+        """
+        Flatten an uploaded image to 8-bit grayscale for Tesseract (1 byte/pixel
+        instead of 3-4). Transparent areas become white, as pytesseract did,
+        and 16-bit samples keep their high byte instead of being clipped.
+
+        Returns:
+            PIL.Image | np.ndarray: 8-bit grayscale image or array
+        """
+        Image, np = _lazy_import('PIL.Image'), _lazy_import('numpy')
+        if image.mode.startswith('I'):
+            # 'I;16*' and 'I' (how older Pillow opens 16-bit PNGs)
+            return (np.asarray(image) >> 8).clip(0, 255).astype(np.uint8)
+
+        if image.mode == 'P' and 'transparency' in image.info:
+            image = image.convert('RGBA')
+        if 'A' in image.getbands():
+            rgba = image.convert('RGBA')
+            background = Image.new('RGB', rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+
+        if image.mode != 'L':
+            image = image.convert('L')
+        return image
+
+    def image_to_text(self, image_source, psm=DEFAULT_PSM, preprocess=False):
+        """Extract text from a single image (path, file-like object or PIL Image)"""
         try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image, lang=self.language)
+            Image = _lazy_import('PIL.Image')
+            if isinstance(image_source, Image.Image):
+                image = image_source
+            else:
+                image = Image.open(image_source)
+                # Decode now so the caller may close the source stream
+                image.load()
+            dpi = image.info.get('dpi', (None,))[0]
+            text = self._ocr_image(self._to_gray(image), psm, round(dpi) if dpi else None, preprocess)
 
             return {
                 'success': True,
@@ -121,19 +519,88 @@ class SimpleOCR:
             }
 
 
-# Initialize OCR
-ocr = SimpleOCR(language='eng')
+@functools.lru_cache(maxsize=8)
+def get_ocr(language):
+    """Shared SimpleOCR per language, so tessdata loads once per worker"""
+    return SimpleOCR(language=language)
+
+
+async def get_ocr_async(language):
+    """get_ocr() for handlers: the engine is built off the event loop"""
+    # tesserocr may install signal handlers on import (cysignals), which only
+    # works on the main thread, so import it here before switching threads
+    _lazy_import('tesserocr')
+    return await asyncio.to_thread(get_ocr, language)
+
+
+@functools.lru_cache(maxsize=None)
+def get_result_cache():
+    """Open the on-disk result cache on first use"""
+    diskcache = _lazy_import('diskcache')
+    return diskcache.Cache(RESULT_CACHE_DIR, size_limit=RESULT_CACHE_SIZE)
+
+
+def cached_pdf_to_text(ocr_instance, pdf_bytes, max_pages, dpi, psm, preprocess):
+    """
+    pdf_to_text memoized on the PDF's SHA-256 plus the OCR parameters.
+    Only successful results are cached.
+
+    Returns:
+        tuple: (result dict, whether it came from the cache)
+    """
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    key = f"{digest}_{max_pages}_{dpi}_{psm}_{int(preprocess)}_{ocr_instance.language}"
+
+    result_cache = get_result_cache()
+    result = result_cache.get(key)
+    if result is not None:
+        return result, True
+
+    result = ocr_instance.pdf_to_text(pdf_bytes, max_pages=max_pages, dpi=dpi, psm=psm, preprocess=preprocess)
+    if result['success']:
+        result_cache.set(key, result, expire=RESULT_CACHE_TTL)
+    return result, False
+
+
+def client_address():
+    """
+    Address to rate-limit on. Each trusted proxy appends one X-Forwarded-For
+    entry, so the client is the TRUSTED_PROXY_HOPS-th entry from the right;
+    anything further left is whatever the client chose to send.
+    """
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+    if TRUSTED_PROXY_HOPS and len(hops) >= TRUSTED_PROXY_HOPS:
+        return hops[-TRUSTED_PROXY_HOPS]
+    return request.remote_addr
+
+
+@app.before_request
+async def limit_ocr_rate():
+    """Reject bursts of OCR requests from one client with 429 + Retry-After"""
+    if not request.path.startswith('/ocr/'):
+        return None
+
+    retry_after = rate_limiter.consume(client_address())
+    if retry_after:
+        return ojson(
+            {'success': False, 'error': 'Too many requests, please retry later'},
+            429,
+            headers={'Retry-After': str(math.ceil(retry_after))}
+        )
+    return None
 
 
 @app.route('/')
-def home():
+async def home():
     """API documentation"""
-    return jsonify({
+    return ojson({
         'service': 'OCR API',
         'version': '1.2',
         'endpoints': {
             '/': 'API documentation (GET)',
             '/ocr/pdf': 'Process PDF file (POST)',
+            '/ocr/pdf/stream': 'Process PDF file, streaming NDJSON lines per page (POST)',
             '/ocr/image': 'Process image file (POST)',
             '/health': 'Health check (GET)'
         },
@@ -142,38 +609,161 @@ def home():
                 'file': 'PDF upload (required if not using file_url/pdf_path)',
                 'language': 'eng (optional)',
                 'max_pages': 10,
-                'dpi': 200
+                'dpi': f'{DEFAULT_DPI} (optional, or "auto" to pick from text size)',
+                'psm': '6 (optional, Tesseract page segmentation mode 1, 3-13)',
+                'preprocess': 'false (optional, denoise + binarize noisy scans first)'
             },
             'pdf (JSON)': {
                 'file_url': 'http(s) URL to a PDF (optional)',
                 'pdf_path': 'server-side path in repo root (optional)',
                 'language': 'eng (optional)',
                 'max_pages': 10,
-                'dpi': 200
+                'dpi': f'{DEFAULT_DPI} (optional, or "auto" to pick from text size)',
+                'psm': '6 (optional, Tesseract page segmentation mode 1, 3-13)',
+                'preprocess': 'false (optional, denoise + binarize noisy scans first)'
             },
             'image (form-data)': {
                 'file': 'PNG/JPG upload',
-                'language': 'eng (optional)'
+                'language': 'eng (optional)',
+                'psm': '6 (optional, Tesseract page segmentation mode 1, 3-13)',
+                'preprocess': 'false (optional, denoise + binarize noisy scans first)'
             }
         },
         'limits': {
             'max_upload_size': '16MB',
             'max_pages_cap': 20,
-            'dpi_cap': 300,
-            'allowed_formats': list(ALLOWED_EXTENSIONS)
+            'dpi_cap': MAX_DPI,
+            'rate_limit': f'{RATE_LIMIT_PER_MINUTE}/minute per client (burst {RATE_LIMIT_BURST})',
+            'allowed_formats': sorted(ALLOWED_EXTENSIONS)
         },
         'note': f'pdf_path looks for files in: {SAFE_BASE_DIR}'
     })
 
 
 @app.route('/health')
-def health():
+async def health():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy'}), 200
+    return ojson({'status': 'healthy'}, 200)
+
+
+async def load_pdf_request():
+    """
+    Parse a PDF OCR request: the parameters plus the PDF bytes from an upload,
+    file_url or pdf_path (see ocr_pdf for the accepted inputs).
+
+    Returns:
+        tuple: (request dict, None), or (None, error response) for bad input
+    """
+    # Accept both form-data and JSON
+    form = await request.form
+    files = await request.files
+    payload = form if form else (await request.get_json(silent=True) or {})
+
+    # Parameters
+    max_pages = int(payload.get('max_pages', 10))
+    dpi = payload.get('dpi')
+    if dpi in (None, ''):
+        dpi = DEFAULT_DPI
+    elif dpi != 'auto':
+        dpi = int(dpi)
+    language = payload.get('language', 'eng')
+    psm = int(payload.get('psm', DEFAULT_PSM))
+    preprocess = parse_flag(payload.get('preprocess', False))
+
+    # Safety caps
+    max_pages = min(max_pages, 20)
+    if dpi != 'auto':
+        dpi = min(dpi, MAX_DPI)
+    if psm not in VALID_PSMS:
+        return None, ojson({'success': False, 'error': 'psm must be 1 or between 3 and 13'}, 400)
+
+    # Determine input source (priority: multipart file > file_url > pdf_path)
+    source = None
+
+    # 1) multipart file
+    if 'file' in files and files['file'].filename:
+        file = files['file']
+
+        if not file.filename.lower().endswith('.pdf'):
+            return None, ojson({'success': False, 'error': 'File must be a PDF'}, 400)
+
+        # Handed to PyMuPDF as bytes; no temp file round trip
+        pdf_source = file.read()
+        source = 'upload'
+
+    # 2) file_url (http/https)
+    elif 'file_url' in payload and payload['file_url']:
+        url = str(payload['file_url']).strip()
+        if not is_http_url(url):
+            return None, ojson({'success': False, 'error': 'file_url must be http/https'}, 400)
+
+        # Stream into memory, enforcing the same cap as uploads
+        max_bytes = app.config['MAX_CONTENT_LENGTH']
+        too_large = {'success': False, 'error': 'file_url exceeds the 16MB limit'}
+        httpx = _lazy_import('httpx')
+        async with httpx.AsyncClient(timeout=60, follow_redirects=True) as client:
+            async with client.stream('GET', url) as r:
+                if r.status_code != 200:
+                    return None, ojson({'success': False, 'error': f'Failed to fetch file_url (HTTP {r.status_code})'}, 400)
+
+                # Basic content-type/extension guard
+                content_type = r.headers.get('Content-Type', '').lower()
+                if ('pdf' not in content_type) and (not url.lower().endswith('.pdf')):
+                    return None, ojson({'success': False, 'error': 'URL does not appear to be a PDF'}, 400)
+
+                content_length = r.headers.get('Content-Length', '')
+                if content_length.isdigit() and int(content_length) > max_bytes:
+                    return None, ojson(too_large, 413)
+
+                buf = io.BytesIO()
+                async for chunk in r.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    buf.write(chunk)
+                    if buf.tell() > max_bytes:
+                        return None, ojson(too_large, 413)
+
+        pdf_source = buf.getvalue()
+        source = 'url'
+
+    # 3) pdf_path (server-side in repo root)
+    elif 'pdf_path' in payload and payload['pdf_path']:
+        user_path_raw = str(payload['pdf_path']).strip()
+        user_path = Path(user_path_raw)
+
+        # If relative, treat as relative to SAFE_BASE_DIR (repo root);
+        # is_safe_path() resolves it
+        if not user_path.is_absolute():
+            user_path = SAFE_BASE_DIR / user_path
+
+        # Enforce .pdf and safe containment
+        if user_path.suffix.lower() != '.pdf':
+            return None, ojson({'success': False, 'error': 'pdf_path must point to a .pdf file'}, 400)
+        if not is_safe_path(user_path):
+            return None, ojson({'success': False, 'error': 'pdf_path is outside the allowed directory'}, 400)
+        if not user_path.exists():
+            return None, ojson({'success': False, 'error': f'pdf_path not found: {user_path.name}'}, 400)
+
+        pdf_source = await asyncio.to_thread(user_path.read_bytes)
+        source = 'path'
+
+    else:
+        return None, ojson({
+            'success': False,
+            'error': 'No input provided. Use multipart "file", or "file_url", or "pdf_path".'
+        }, 400)
+
+    return {
+        'pdf_source': pdf_source,
+        'source': source,
+        'max_pages': max_pages,
+        'dpi': dpi,
+        'language': language,
+        'psm': psm,
+        'preprocess': preprocess
+    }, None
 
 
 @app.route('/ocr/pdf', methods=['POST'])
-def ocr_pdf():
+async def ocr_pdf():
     """
     Process PDF with OCR. Accepts:
       - multipart/form-data: file=<PDF file>
@@ -186,161 +776,144 @@ def ocr_pdf():
       "max_pages": 20
     }
     """
-    tmp_path = None
-    should_delete_tmp = False
-
     try:
-        # Accept both form-data and JSON
-        payload = request.form if request.form else (request.get_json(silent=True) or {})
-
-        # Parameters
-        max_pages = int(payload.get('max_pages', 10))
-        dpi = int(payload.get('dpi', 200))
-        language = payload.get('language', 'eng')
-
-        # Safety caps
-        max_pages = min(max_pages, 20)
-        dpi = min(dpi, 300)
-
-        # Determine input source (priority: multipart file > file_url > pdf_path)
-        source = None
-
-        # 1) multipart file
-        if 'file' in request.files and request.files['file'].filename:
-            file = request.files['file']
-
-            if not file.filename.lower().endswith('.pdf'):
-                return jsonify({'success': False, 'error': 'File must be a PDF'}), 400
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                file.save(tmp_file.name)
-                tmp_path = tmp_file.name
-                should_delete_tmp = True
-                source = 'upload'
-
-        # 2) file_url (http/https)
-        elif 'file_url' in payload and payload['file_url']:
-            url = str(payload['file_url']).strip()
-            if not is_http_url(url):
-                return jsonify({'success': False, 'error': 'file_url must be http/https'}), 400
-
-            # Download to temp file
-            r = requests.get(url, timeout=60)
-            if r.status_code != 200:
-                return jsonify({'success': False, 'error': f'Failed to fetch file_url (HTTP {r.status_code})'}), 400
-
-            # Basic content-type/extension guard
-            content_type = r.headers.get('Content-Type', '').lower()
-            if ('pdf' not in content_type) and (not url.lower().endswith('.pdf')):
-                return jsonify({'success': False, 'error': 'URL does not appear to be a PDF'}), 400
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(r.content)
-                tmp_path = tmp_file.name
-                should_delete_tmp = True
-                source = 'url'
-
-        # 3) pdf_path (server-side in repo root)
-        elif 'pdf_path' in payload and payload['pdf_path']:
-            user_path_raw = str(payload['pdf_path']).strip()
-            user_path = Path(user_path_raw)
-
-            # If relative, treat as relative to SAFE_BASE_DIR (repo root)
-            if not user_path.is_absolute():
-                user_path = (SAFE_BASE_DIR / user_path).resolve()
-
-            # Enforce .pdf and safe containment
-            if user_path.suffix.lower() != '.pdf':
-                return jsonify({'success': False, 'error': 'pdf_path must point to a .pdf file'}), 400
-            if not is_safe_path(SAFE_BASE_DIR, user_path):
-                return jsonify({'success': False, 'error': 'pdf_path is outside the allowed directory'}), 400
-            if not user_path.exists():
-                return jsonify({'success': False, 'error': f'pdf_path not found: {user_path.name}'}), 400
-
-            tmp_path = str(user_path)
-            should_delete_tmp = False
-            source = 'path'
-
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'No input provided. Use multipart "file", or "file_url", or "pdf_path".'
-            }), 400
-
-        # Process PDF
-        ocr_instance = SimpleOCR(language=language)
-        result = ocr_instance.pdf_to_text(tmp_path, max_pages=max_pages, dpi=dpi)
-
-        # Cleanup if we created a temp file
-        if should_delete_tmp and tmp_path:
-            try:
-                os.unlink(tmp_path)
-            except Exception:
-                pass
+        pdf_request, error = await load_pdf_request()
+        if error is not None:
+            return error
+        source = pdf_request['source']
+
+        # Process PDF off the event loop (tesserocr releases the GIL)
+        ocr_instance = await get_ocr_async(pdf_request['language'])
+        result, cached = await asyncio.to_thread(
+            cached_pdf_to_text,
+            ocr_instance,
+            pdf_request['pdf_source'],
+            pdf_request['max_pages'],
+            pdf_request['dpi'],
+            pdf_request['psm'],
+            pdf_request['preprocess']
+        )
 
         if result['success']:
-            return jsonify({
+            return ojson({
                 'success': True,
                 'source': source,
                 'text': result['text'],
                 'num_pages': result['num_pages'],
                 'was_truncated': result['was_truncated'],
+                'method': result['method'],
+                'dpi': result['dpi'],
+                'cached': cached,
                 'character_count': len(result['text'])
-            }), 200
+            }, 200)
         else:
-            return jsonify({'success': False, 'error': result['error']}), 500
+            return ojson({'success': False, 'error': result['error']}, 500)
 
     except Exception as e:
-        if should_delete_tmp and tmp_path:
-            try:
-                os.unlink(tmp_path)
-            except Exception:
-                pass
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojson({'success': False, 'error': str(e)}, 500)
+
+
+@app.route('/ocr/pdf/stream', methods=['POST'])
+async def ocr_pdf_stream():
+    """
+    Same inputs as /ocr/pdf, but the response is NDJSON: a summary line,
+    then one {"page": n, "text": ...} line per page as soon as it is done.
+    Pages are not joined or cached; if the client disconnects, remaining
+    pages are skipped. The stream is exempt from RESPONSE_TIMEOUT, so long
+    scans run to completion, and a failure mid-stream is always reported
+    as a final {"success": false, "error": ...} line.
+    """
+    try:
+        pdf_request, error = await load_pdf_request()
+        if error is not None:
+            return error
+
+        ocr_instance = await get_ocr_async(pdf_request['language'])
+        pages = ocr_instance.iter_pages(
+            pdf_request['pdf_source'],
+            max_pages=pdf_request['max_pages'],
+            dpi=pdf_request['dpi'],
+            psm=pdf_request['psm'],
+            preprocess=pdf_request['preprocess']
+        )
+
+        # One thread per stream, so next() and close() never overlap
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        # Opening the PDF and picking the DPI happen before the first byte,
+        # so bad input still gets a plain JSON error
+        try:
+            summary = await loop.run_in_executor(executor, next, pages)
+        except Exception:
+            executor.shutdown(wait=False)
+            raise
+    except Exception as e:
+        return ojson({'success': False, 'error': str(e)}, 500)
+
+    async def stream():
+        try:
+            yield orjson.dumps({'success': True, 'source': pdf_request['source'], **summary}) + b'\n'
+            while True:
+                page = await loop.run_in_executor(executor, next, pages, None)
+                if page is None:
+                    break
+                yield orjson.dumps(page) + b'\n'
+        except Exception as e:
+            yield orjson.dumps({'success': False, 'error': str(e)}) + b'\n'
+        finally:
+            # Queued behind any in-flight page; stops the render/OCR pipeline
+            executor.submit(pages.close)
+            executor.shutdown(wait=False)
+
+    response = Response(stream(), mimetype='application/x-ndjson')
+    # Quart otherwise cuts the body off after RESPONSE_TIMEOUT (60s) without
+    # an error line; a many-page scan queued on OCR_SEM easily takes longer
+    response.timeout = None
+    return response
 
 
 @app.route('/ocr/image', methods=['POST'])
-def ocr_image():
+async def ocr_image():
     """Process image file with OCR (PNG/JPG/JPEG)"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
+    files = await request.files
+    if 'file' not in files:
+        return ojson({'error': 'No file provided'}, 400)
 
-    file = request.files['file']
+    file = files['file']
 
     if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+        return ojson({'error': 'No file selected'}, 400)
 
     if not allowed_file(file.filename):
-        return jsonify({'error': 'Invalid file type. Allowed: PNG, JPG, JPEG'}), 400
+        return ojson({'error': 'Invalid file type. Allowed: PNG, JPG, JPEG'}, 400)
 
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as tmp_file:
-            file.save(tmp_file.name)
-            tmp_path = tmp_file.name
+        form = await request.form
+        language = form.get('language', 'eng')
+        psm = int(form.get('psm', DEFAULT_PSM))
+        preprocess = parse_flag(form.get('preprocess', False))
+        if psm not in VALID_PSMS:
+            return ojson({'error': 'psm must be 1 or between 3 and 13'}, 400)
 
-        language = request.form.get('language', 'eng')
-        ocr_instance = SimpleOCR(language=language)
-        result = ocr_instance.image_to_text(tmp_path)
-
-        try:
-            os.unlink(tmp_path)
-        except Exception:
-            pass
+        ocr_instance = await get_ocr_async(language)
+        # Decode straight from the upload stream; nothing touches disk
+        result = await asyncio.to_thread(ocr_instance.image_to_text, file.stream, psm, preprocess)
 
         if result['success']:
-            return jsonify({
+            return ojson({
                 'success': True,
                 'text': result['text'],
                 'character_count': len(result['text'])
-            }), 200
+            }, 200)
         else:
-            return jsonify({'success': False, 'error': result['error']}), 500
+            return ojson({'success': False, 'error': result['error']}, 500)
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojson({'success': False, 'error': str(e)}, 500)
 
 
 if __name__ == '__main__':
     # For local development
     app.run(debug=True, host='0.0.0.0', port=5000)
-    # In production, Render uses gunicorn to load `app`
+    # In production, Render uses hypercorn to load `app`
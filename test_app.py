@@ -0,0 +1,351 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+import app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeAPI:
+    """Stands in for tesserocr.PyTessBaseAPI, recording the image it is given"""
+
+    def SetPageSegMode(self, psm):
+        self.psm = psm
+
+    def SetImageBytes(self, data, width, height, bytes_per_pixel, bytes_per_line):
+        self.image = (data, width, height)
+
+    def SetSourceResolution(self, dpi):
+        self.dpi = dpi
+
+    def GetUTF8Text(self):
+        return 'text'
+
+    def End(self):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(app.time, 'monotonic', fake)
+    return fake
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    # No tessdata needed: tests that OCR patch _ocr_image themselves
+    monkeypatch.setattr(app.SimpleOCR, '_new_api', lambda self: FakeAPI())
+    monkeypatch.setattr(app, 'MAX_OCR_WORKERS', 4)
+    monkeypatch.setattr(app, 'OCR_SEM', threading.BoundedSemaphore(4))
+    return app.SimpleOCR()
+
+
+# --- rate limiting -----------------------------------------------------------
+
+def test_token_bucket_allows_burst_then_reports_retry_after(clock):
+    bucket = app.TokenBucket(rate=0.5, burst=2)
+
+    assert bucket.consume('a') == 0
+    assert bucket.consume('a') == 0
+    assert bucket.consume('a') == pytest.approx(2.0)
+
+    # Other clients have their own bucket
+    assert bucket.consume('b') == 0
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = app.TokenBucket(rate=0.5, burst=2)
+    bucket.consume('a')
+    bucket.consume('a')
+
+    clock.now += 1
+    assert bucket.consume('a') == pytest.approx(1.0)
+    clock.now += 1
+    assert bucket.consume('a') == 0
+
+    # Refill stops at burst
+    clock.now += 60
+    assert bucket.consume('a') == 0
+    assert bucket.consume('a') == 0
+    assert bucket.consume('a') > 0
+
+
+def test_rate_limited_request_gets_429_with_retry_after(monkeypatch, clock):
+    monkeypatch.setattr(app, 'rate_limiter', app.TokenBucket(rate=0.25, burst=1))
+
+    async def post_twice():
+        client = app.app.test_client()
+        # No file: passes the limiter, then fails validation with 400
+        first = await client.post('/ocr/image')
+        second = await client.post('/ocr/image')
+        return first, second
+
+    first, second = asyncio.run(post_twice())
+    assert first.status_code == 400
+    assert second.status_code == 429
+    assert second.headers['Retry-After'] == '4'
+
+
+def test_health_is_not_rate_limited(monkeypatch, clock):
+    monkeypatch.setattr(app, 'rate_limiter', app.TokenBucket(rate=0.25, burst=1))
+
+    async def get_health():
+        client = app.app.test_client()
+        return [(await client.get('/health')).status_code for _ in range(3)]
+
+    assert asyncio.run(get_health()) == [200, 200, 200]
+
+
+# --- client address / proxy trust --------------------------------------------
+
+def client_address_for(headers):
+    async def resolve():
+        # Quart's ASGI layer puts the socket peer in Remote-Addr
+        ctx = app.app.test_request_context(
+            '/ocr/pdf', method='POST', headers={'Remote-Addr': '198.51.100.9', **headers}
+        )
+        async with ctx:
+            return app.client_address()
+
+    return asyncio.run(resolve())
+
+
+def test_client_address_ignores_forwarded_for_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(app, 'TRUSTED_PROXY_HOPS', 0)
+    assert client_address_for({'X-Forwarded-For': '203.0.113.7'}) == '198.51.100.9'
+
+
+def test_client_address_uses_hop_appended_by_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(app, 'TRUSTED_PROXY_HOPS', 1)
+    # The client sent "1.2.3.4"; the proxy appended the real peer
+    spoofed = {'X-Forwarded-For': '1.2.3.4, 203.0.113.7'}
+    assert client_address_for(spoofed) == '203.0.113.7'
+
+
+def test_client_address_falls_back_when_proxy_hops_are_missing(monkeypatch):
+    monkeypatch.setattr(app, 'TRUSTED_PROXY_HOPS', 2)
+    assert client_address_for({'X-Forwarded-For': '203.0.113.7'}) == '198.51.100.9'
+    monkeypatch.setattr(app, 'TRUSTED_PROXY_HOPS', 1)
+    assert client_address_for({}) == '198.51.100.9'
+
+
+# --- pdf_path containment ----------------------------------------------------
+
+@pytest.fixture
+def safe_base(tmp_path, monkeypatch):
+    base = tmp_path / 'base'
+    base.mkdir()
+    (base / 'inside.pdf').write_bytes(b'%PDF-1.4')
+    (tmp_path / 'outside.pdf').write_bytes(b'%PDF-1.4')
+    monkeypatch.setattr(app, 'SAFE_BASE_DIR', base)
+    monkeypatch.setattr(app, '_SAFE_BASE_RESOLVED', os.path.realpath(base))
+    return base
+
+
+def test_is_safe_path_accepts_files_inside_base(safe_base):
+    assert app.is_safe_path(safe_base / 'inside.pdf')
+    assert app.is_safe_path(safe_base / 'sub' / '..' / 'inside.pdf')
+
+
+def test_is_safe_path_rejects_dotdot_escape(safe_base):
+    assert not app.is_safe_path(safe_base / '..' / 'outside.pdf')
+
+
+def test_is_safe_path_rejects_sibling_with_common_prefix(safe_base, tmp_path):
+    sibling = tmp_path / 'base-other'
+    sibling.mkdir()
+    assert not app.is_safe_path(sibling / 'x.pdf')
+
+
+def test_is_safe_path_rejects_symlink_escape(safe_base, tmp_path):
+    (safe_base / 'link.pdf').symlink_to(tmp_path / 'outside.pdf')
+    (safe_base / 'linkdir').symlink_to(tmp_path)
+    assert not app.is_safe_path(safe_base / 'link.pdf')
+    assert not app.is_safe_path(safe_base / 'linkdir' / 'outside.pdf')
+
+
+def test_pdf_path_escape_is_rejected_with_400(safe_base, monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', app.TokenBucket(rate=1, burst=10))
+
+    async def post():
+        client = app.app.test_client()
+        return await client.post('/ocr/pdf', json={'pdf_path': '../outside.pdf'})
+
+    response = asyncio.run(post())
+    assert response.status_code == 400
+    assert 'outside the allowed directory' in asyncio.run(response.get_data(as_text=True))
+
+
+# --- page pipeline ordering and cancellation --------------------------------
+
+def test_iter_ocr_yields_pages_in_order_when_they_finish_out_of_order(ocr, monkeypatch):
+    num_pages = 8
+    finished = []
+
+    # The "bitmap" is just the page index; later pages OCR faster
+    monkeypatch.setattr(ocr, '_render_gray', lambda doc, page_index, dpi: page_index)
+
+    def fake_ocr(image, psm, dpi, preprocess):
+        time.sleep(0.01 * (num_pages - image))
+        finished.append(image + 1)
+        return f'text {image + 1}'
+
+    monkeypatch.setattr(ocr, '_ocr_image', fake_ocr)
+
+    pages = list(ocr._iter_ocr(None, list(range(1, num_pages + 1)), 200, app.DEFAULT_PSM))
+
+    assert [page['page'] for page in pages] == list(range(1, num_pages + 1))
+    assert [page['text'] for page in pages] == [f'text {n}' for n in range(1, num_pages + 1)]
+    assert finished != sorted(finished)
+
+
+def test_iter_ocr_close_stops_remaining_pages(ocr, monkeypatch):
+    num_pages = 50
+    rendered = []
+
+    def fake_render(doc, page_index, dpi):
+        rendered.append(page_index)
+        return page_index
+
+    monkeypatch.setattr(ocr, '_render_gray', fake_render)
+    monkeypatch.setattr(ocr, '_ocr_image', lambda image, psm, dpi, preprocess: time.sleep(0.01) or str(image))
+
+    pages = ocr._iter_ocr(None, list(range(1, num_pages + 1)), 200, app.DEFAULT_PSM)
+    assert next(pages)['page'] == 1
+    pages.close()
+
+    # close() waits for the pool; nothing is rendered afterwards
+    count = len(rendered)
+    time.sleep(0.05)
+    assert len(rendered) == count < num_pages
+
+
+def test_iter_ocr_raises_page_error(ocr, monkeypatch):
+    monkeypatch.setattr(ocr, '_render_gray', lambda doc, page_index, dpi: page_index)
+
+    def fake_ocr(image, psm, dpi, preprocess):
+        if image == 2:
+            raise RuntimeError('bad page')
+        return str(image)
+
+    monkeypatch.setattr(ocr, '_ocr_image', fake_ocr)
+
+    with pytest.raises(RuntimeError, match='bad page'):
+        list(ocr._iter_ocr(None, [1, 2, 3, 4], 200, app.DEFAULT_PSM))
+
+
+def test_iter_pages_merges_text_layer_and_ocr_pages_in_order(ocr, monkeypatch):
+    fitz = pytest.importorskip('fitz')
+    doc = fitz.open()
+    for page_no in range(1, 4):
+        page = doc.new_page()
+        if page_no != 2:
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), f'digital{page_no} ' * 100)
+    pdf_bytes = doc.tobytes()
+
+    monkeypatch.setattr(ocr, '_ocr_image', lambda image, psm, dpi, preprocess: 'scanned')
+
+    summary, *pages = ocr.iter_pages(pdf_bytes)
+
+    assert summary['method'] == 'mixed'
+    assert summary['dpi'] == app.DEFAULT_DPI
+    assert [page['page'] for page in pages] == [1, 2, 3]
+    assert pages[0]['text'].startswith('digital1')
+    assert pages[1]['text'] == 'scanned'
+    assert pages[2]['text'].startswith('digital3')
+
+
+# --- preprocessing -----------------------------------------------------------
+
+def test_ocr_image_skips_preprocessing_by_default(ocr, monkeypatch):
+    np = pytest.importorskip('numpy')
+    page = np.full((4, 6), 200, dtype=np.uint8)
+
+    def fail(image):
+        raise AssertionError('preprocess_image should not run')
+
+    monkeypatch.setattr(ocr, 'preprocess_image', fail)
+    assert ocr._ocr_image(page, app.DEFAULT_PSM, 200) == 'text'
+    api = ocr._apis.get_nowait()
+    assert api.image == (page.tobytes(), 6, 4)
+    assert api.dpi == 200
+
+
+def test_ocr_image_preprocesses_when_asked(ocr, monkeypatch):
+    np = pytest.importorskip('numpy')
+    page = np.full((4, 6), 200, dtype=np.uint8)
+    binary = np.zeros((4, 6), dtype=np.uint8)
+    monkeypatch.setattr(ocr, 'preprocess_image', lambda image: binary)
+
+    ocr._ocr_image(page, app.DEFAULT_PSM, 200, preprocess=True)
+    assert ocr._apis.get_nowait().image == (binary.tobytes(), 6, 4)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (True, True), ('true', True), ('1', True), ('Yes', True),
+    (False, False), ('false', False), ('0', False), ('', False),
+])
+def test_parse_flag(value, expected):
+    assert app.parse_flag(value) is expected
+
+
+# --- page segmentation mode --------------------------------------------------
+
+@pytest.mark.parametrize('psm', [0, 2, 14, -1])
+def test_psm_without_recognition_is_rejected(psm, monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', app.TokenBucket(rate=1, burst=10))
+
+    async def post():
+        client = app.app.test_client()
+        return await client.post('/ocr/pdf', json={'pdf_path': 'missing.pdf', 'psm': psm})
+
+    response = asyncio.run(post())
+    assert response.status_code == 400
+    assert 'psm must be' in asyncio.run(response.get_data(as_text=True))
+
+
+def test_recognizing_psms_are_accepted():
+    assert app.DEFAULT_PSM in app.VALID_PSMS
+    assert sorted(app.VALID_PSMS) == [1, *range(3, 14)]
+
+
+# --- uploaded image modes ----------------------------------------------------
+
+def test_image_to_text_flattens_transparency_onto_white(ocr):
+    Image = pytest.importorskip('PIL.Image')
+    np = pytest.importorskip('numpy')
+    # Black "text" on a fully transparent (black) background
+    pixels = np.zeros((4, 6, 4), dtype=np.uint8)
+    pixels[1:3, 1:3, 3] = 255
+    image = Image.fromarray(pixels, 'RGBA')
+
+    assert ocr.image_to_text(image)['success']
+
+    data, width, height = ocr._apis.get_nowait().image
+    gray = np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+    expected = np.full((4, 6), 255, dtype=np.uint8)
+    expected[1:3, 1:3] = 0
+    assert (gray == expected).all()
+
+
+def test_image_to_text_keeps_16_bit_gray_levels(ocr):
+    Image = pytest.importorskip('PIL.Image')
+    np = pytest.importorskip('numpy')
+    samples = np.array([[0, 0x4000, 0x8000, 0xffff]], dtype=np.uint16)
+    image = Image.frombytes('I;16', (4, 1), samples.tobytes())
+
+    assert ocr.image_to_text(image)['success']
+
+    data, _, _ = ocr._apis.get_nowait().image
+    assert list(data) == [0, 0x40, 0x80, 0xff]